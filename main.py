@@ -1,11 +1,33 @@
 """Show genotypes frequencies from a VCF file, separated by cohorts."""
 
 import argparse
+import csv
 import re
 from pathlib import Path
 
+import cyvcf2
+import numpy as np
 import pandas as pd
-import pysam
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+# Genotype labels indexed by cyvcf2's ``gt_types`` codes
+# (HOM_REF=0, HET=1, UNKNOWN=2, HOM_ALT=3). Labels stand for genotype classes, not
+# literal calls: "0/1" is any heterozygous call (0/2, 1/2, ...), "1/1" any homozygous
+# ALT call (2/2, ...) and haploid 0/1 count as "0/0"/"1/1". Calls with a missing
+# allele (0/.), haploid calls of a second ALT allele, polyploid calls (0/0/1, which
+# ``gt_types`` classifies by their first two alleles only) and records without a GT
+# field count as "./.".
+GENOTYPES = ["0/0", "0/1", "./.", "1/1"]
+
+# Typical genotype order: hom ref > het > hom alt > missing
+GENOTYPES_ORDER = ["0/0", "0/1", "1/1", "./."]
+
+# Rows allocated at a time for per-record arrays when the VCF has no index
+_RECORDS_CHUNK = 1024
+
+# Sample IDs of the cohort files, e.g. C01234-ExC123-xgenV1
+ID_PATTERN = re.compile(r"^C\d+-ExC\d+-xgenV\d+$")
 
 
 def main():
@@ -15,9 +37,9 @@ def main():
     This function implements a command-line interface that:
     - Parses required and optional command-line arguments.
     - Loads cohort definitions from one or more CSV files.
-    - For each cohort, extracts the genotype matrix for the cohort samples from the provided VCF,
-        computes genotype frequencies, and either writes the results to CSV files in an output directory
-        or prints them to stdout.
+    - Counts the genotypes of every cohort in a single pass over the provided VCF.
+    - For each cohort, computes genotype frequencies and either writes the results to CSV files
+        in an output directory or prints them to stdout.
     """
     parser = argparse.ArgumentParser(
         description="Show genotypes frequencies from a VCF file."
@@ -43,17 +65,27 @@ def main():
 
     cohort_ids = get_cohort_ids(cohorts_path)
 
-    for cohort_name in cohort_ids.columns:
-        print(f"⚙️ Processing cohort: {cohort_name}")
+    cohorts = {
+        cohort_name: cohort_ids[cohort_name].dropna().tolist()
+        for cohort_name in cohort_ids.columns
+    }
+    frequencies = variant_freqs(vcf_path, cohorts)
 
-        ids_to_keep = cohort_ids[cohort_name].dropna().tolist()
-        df_genotypes = genotypes_matrix(vcf_path, ids_to_keep=ids_to_keep)
-        df_frequencies = genotype_frequencies(df_genotypes)
+    for cohort_name, df_frequencies in frequencies.items():
+        print(f"⚙️ Processing cohort: {cohort_name}")
 
         if output_dir:
             output_dir.mkdir(parents=True, exist_ok=True)
             cohort_output_path = output_dir / f"{cohort_name}.csv"
-            df_frequencies.to_csv(cohort_output_path)
+            # pyarrow's CSV writer is much faster than DataFrame.to_csv for numeric data
+            table = pa.Table.from_pandas(
+                df_frequencies.reset_index(), preserve_index=False
+            )
+            # No field needs quoting; match DataFrame.to_csv's unquoted output
+            write_options = pacsv.WriteOptions(
+                quoting_style="none", quoting_header="none"
+            )
+            pacsv.write_csv(table, cohort_output_path, write_options)
             print(f"✅ Genotype frequencies saved to {cohort_output_path}")
         else:
             print(df_frequencies)
@@ -73,47 +105,65 @@ def get_cohort_ids(cohorts_path: list[Path]) -> pd.DataFrame:
     """
 
     cohorts = [
-        pd.read_csv(path, sep=None, engine="python", header=None)
+        pd.read_csv(path, sep=_detect_sep(path), engine="c", header=None, dtype=str)
         for path in cohorts_path
     ]
-    max_len = max(len(cohort) for cohort in cohorts)
-
-    for i, cohort in enumerate(cohorts):
-        # The files do not have a consistent header, so we search for the ID column
-        id_pattern = re.compile(r"^C\d+-ExC\d+-xgenV\d+$")
-        col_matches = [
-            col
-            for col in cohort.columns
-            if cohort[col].astype(str).str.match(id_pattern).any()
-        ]
-        id_col = next(iter(col_matches), None)
+    ids_list = []
+    for cohort in cohorts:
+        # The files do not have a consistent header, so we search for the ID column.
+        # Stop at the first match instead of scanning every remaining column.
+        id_col = next(
+            (
+                col
+                for col in cohort.columns
+                if cohort[col].dropna().str.match(ID_PATTERN).any()
+            ),
+            None,
+        )
         if id_col is None:
             raise ValueError(
-                f"No matching {id_pattern.pattern} columns found in cohort."
+                f"No matching {ID_PATTERN.pattern} columns found in cohort."
             )
 
         # Only ID column is required
-        cohort = cohort[[id_col]].dropna().reset_index(drop=True)
-        cohorts[i] = cohort
+        ids_list.append(cohort[id_col].dropna().tolist())
 
-        # Some cohorts have fewer IDs; pad with NaNs
-        if len(cohort) < max_len:
-            diff = max_len - len(cohort)
-            padding = pd.DataFrame({id_col: [pd.NA] * diff})
-            cohorts[i] = pd.concat([cohort, padding], ignore_index=True)
+    # Some cohorts have fewer IDs; pad with missing values in a single preallocated array
+    max_len = max(len(ids) for ids in ids_list)
+    padded = np.full((max_len, len(ids_list)), None, dtype=object)
+    for j, ids in enumerate(ids_list):
+        padded[: len(ids), j] = ids
 
-    cohort_ids = pd.concat(cohorts, axis=1)
-    cohort_ids.columns = [path.stem for path in cohorts_path]
+    cohort_ids = pd.DataFrame(padded, columns=[path.stem for path in cohorts_path])
     return cohort_ids
 
 
+def _detect_sep(path: Path) -> str:
+    """Detect the delimiter of a CSV file from its first bytes.
+
+    Args:
+        path (Path): Path to the CSV file.
+
+    Returns:
+        str: Detected delimiter, or "," if it cannot be determined.
+    """
+    # Same encoding pd.read_csv uses, so both read the same characters
+    with open(path, newline="", encoding="utf-8") as f:
+        sample = f.read(4096)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+    except csv.Error:
+        return ","
+
+
 def genotypes_matrix(
     vcf_path: Path, ids_to_keep: list[str] | None = None
 ) -> pd.DataFrame:
     """Read VCF and return a DataFrame with samples as rows and variants as columns.
 
     Create a DataFrame containing the genotypes for each sample (rows) and each variant (columns).
-    Genotypes are represented as strings (i.e., "0/0", "0/1", "1/1", "./.").
+    Genotypes are represented as int8 codes indexing `GENOTYPES` (i.e., 0="0/0", 1="0/1", 2="./.", 3="1/1"),
+    where "0/1" and "1/1" stand for any heterozygous and any homozygous ALT call.
 
     Args:
         vcf_path (Path): Path to the VCF file.
@@ -122,36 +172,174 @@ def genotypes_matrix(
     Returns:
         pd.DataFrame: DataFrame with samples as rows and variants as columns.
     """
-    vcf = pysam.VariantFile(str(vcf_path))
-    samples = list(vcf.header.samples)
-    if ids_to_keep is not None:
-        ids_set = set(ids_to_keep)  # For O(1) lookups
-        samples = [s for s in samples if s in ids_set]
-
-    data = {s: [] for s in samples}
-    variant_ids = []
-
-    for rec in vcf.fetch():
-        vid = f"{rec.chrom}_{rec.pos}"
-        variant_ids.append(vid)
-        for s in samples:
-            sample = rec.samples[s]
-            gt = sample.get("GT")
-
-            if gt is None:
-                gstr = "./."
-            else:
-                sep = "/"
-                # None alleles as '.'
-                gstr = sep.join("." if a is None else str(a) for a in gt)
-            data[s].append(gstr)
-
-    df = pd.DataFrame(data, index=variant_ids).T
+    vcf = _open_vcf(vcf_path, ids_to_keep)
+    samples = vcf.samples
+
+    codes = np.empty((_estimate_n_records(vcf_path, vcf), len(samples)), dtype=np.int8)
+    n_variants = 0
+    chroms = []
+    poss = []
+
+    for rec in vcf:
+        if n_variants == len(codes):
+            codes = _grow_rows(codes)
+        chroms.append(rec.CHROM)
+        poss.append(rec.POS)
+        # One int8 code per sample, decoded in a single C call
+        codes[n_variants] = _genotype_codes(rec, len(samples))
+        n_variants += 1
+    vcf.close()
+
+    if n_variants < len(codes):
+        codes = codes[:n_variants].copy()
+    variant_ids = _variant_ids(chroms, poss)
+
+    df = pd.DataFrame(codes.T, index=samples, columns=variant_ids)
     df.index.name = "sample"
     df.columns.name = "variant"
     return df
 
 
+def variant_freqs(
+    vcf_path: Path, cohorts: dict[str, list[str]]
+) -> dict[str, pd.DataFrame]:
+    """Genotype frequencies for each variant and cohort, counted while reading the VCF.
+
+    The VCF is read once, decoding only the samples of the cohorts. Genotypes are counted
+    record by record, so the samples x variants matrix is never built. For each cohort the
+    result equals `genotype_frequencies(genotypes_matrix(vcf_path, ids_to_keep))`.
+
+    Args:
+        vcf_path (Path): Path to the VCF file.
+        cohorts (dict[str, list[str]]): Sample IDs of each cohort, by cohort name.
+
+    Returns:
+        dict[str, pd.DataFrame]: DataFrame with variants as rows and genotype frequencies as columns,
+            by cohort name.
+    """
+    vcf = _open_vcf(vcf_path, list(set().union(*cohorts.values())))
+    samples = np.asarray(vcf.samples, dtype=str)
+
+    # Give each cohort its own block of len(GENOTYPES) bins, so that a single
+    # bincount per record counts the genotypes of every cohort at once
+    members = [np.flatnonzero(np.isin(samples, ids)) for ids in cohorts.values()]
+    sample_idx = np.concatenate([np.empty(0, dtype=np.intp), *members])
+    offsets = np.repeat(
+        np.arange(len(members)) * len(GENOTYPES), [len(idx) for idx in members]
+    )
+    n_bins = len(members) * len(GENOTYPES)
+
+    counts = np.empty(
+        (_estimate_n_records(vcf_path, vcf), len(members), len(GENOTYPES)),
+        dtype=np.int32,
+    )
+    n_variants = 0
+    chroms = []
+    poss = []
+
+    for rec in vcf:
+        if n_variants == len(counts):
+            counts = _grow_rows(counts)
+        chroms.append(rec.CHROM)
+        poss.append(rec.POS)
+        # bincount casts to intp anyway; doing it here also covers the float64
+        # empty array cyvcf2 returns when no samples are selected
+        codes = _genotype_codes(rec, len(samples)).astype(np.intp, copy=False)
+        bins = np.bincount(offsets + codes[sample_idx], minlength=n_bins)
+        counts[n_variants] = bins.reshape(len(members), len(GENOTYPES))
+        n_variants += 1
+    vcf.close()
+
+    variant_ids = _variant_ids(chroms, poss)
+    return {
+        cohort_name: _frequencies(counts[:n_variants, i], variant_ids)
+        for i, cohort_name in enumerate(cohorts)
+    }
+
+
+def _open_vcf(vcf_path: Path, ids_to_keep: list[str] | None) -> cyvcf2.VCF:
+    """Open a VCF, restricting genotype decoding to the requested samples.
+
+    Args:
+        vcf_path (Path): Path to the VCF file.
+        ids_to_keep (list[str]): List of sample IDs to decode. If None, decode all samples.
+
+    Returns:
+        cyvcf2.VCF: VCF reader. Samples not present in the VCF are ignored.
+    """
+    vcf = cyvcf2.VCF(str(vcf_path), strict_gt=True)
+    if ids_to_keep is not None:
+        ids_set = set(ids_to_keep)  # For O(1) lookups
+        # Let htslib restrict FORMAT decoding to the requested samples present in the VCF
+        vcf.set_samples([s for s in vcf.samples if s in ids_set])
+    return vcf
+
+
+def _genotype_codes(rec: cyvcf2.Variant, n_samples: int) -> np.ndarray:
+    """Genotype codes of a VCF record, one per sample, indexing `GENOTYPES`.
+
+    Records without a GT field count every sample as "./.", as cyvcf2 cannot decode their
+    `gt_types`. So do calls with more than two alleles, which `gt_types` would classify by
+    their first two alleles only.
+
+    Args:
+        rec (cyvcf2.Variant): VCF record.
+        n_samples (int): Number of samples decoded by the VCF reader.
+
+    Returns:
+        np.ndarray: Genotype code of each sample.
+    """
+    if "GT" not in rec.FORMAT:
+        return np.full(n_samples, GENOTYPES.index("./."), dtype=np.intp)
+    codes = rec.gt_types
+    if rec.ploidy > 2:
+        # Shorter calls in mixed-ploidy records are padded with -2 (vector end)
+        alleles = rec.genotype.array()[:, :-1]
+        polyploid = (alleles != -2).sum(axis=1) > 2
+        codes = np.where(polyploid, GENOTYPES.index("./."), codes)
+    return codes
+
+
+def _estimate_n_records(vcf_path: Path, vcf: cyvcf2.VCF) -> int:
+    """Number of rows to preallocate for the records of a VCF.
+
+    Args:
+        vcf_path (Path): Path to the VCF file.
+        vcf (cyvcf2.VCF): VCF reader of `vcf_path`.
+
+    Returns:
+        int: Record count from the index if there is one, otherwise `_RECORDS_CHUNK`.
+    """
+    has_index = any(Path(f"{vcf_path}{ext}").exists() for ext in (".tbi", ".csi"))
+    return vcf.num_records if has_index else _RECORDS_CHUNK
+
+
+def _grow_rows(arr: np.ndarray) -> np.ndarray:
+    """Grow a preallocated array along its first axis when it is full.
+
+    Args:
+        arr (np.ndarray): Full array.
+
+    Returns:
+        np.ndarray: Copy of `arr` with at least twice as many rows (and at least `_RECORDS_CHUNK` more).
+    """
+    chunk = np.empty((max(len(arr), _RECORDS_CHUNK), *arr.shape[1:]), dtype=arr.dtype)
+    return np.concatenate([arr, chunk])
+
+
+def _variant_ids(chroms: list[str], poss: list[int]) -> pd.Index:
+    """Build "chrom_pos" variant IDs in one vectorized pass instead of per record.
+
+    Args:
+        chroms (list[str]): Chromosome of each record.
+        poss (list[int]): Position of each record.
+
+    Returns:
+        pd.Index: Variant IDs, e.g. "chr1_123456".
+    """
+    return pd.Index(chroms).astype(str) + "_" + pd.Index(poss).astype(str)
+
+
 def genotype_frequencies(df: pd.DataFrame) -> pd.DataFrame:
     """Genotype frequencies for each variant.
 
@@ -159,17 +347,34 @@ def genotype_frequencies(df: pd.DataFrame) -> pd.DataFrame:
     return a DataFrame with variants as rows and genotype frequencies as columns.
 
     Args:
-        df (pd.DataFrame): DataFrame with samples as rows and variants as columns.
+        df (pd.DataFrame): DataFrame of genotype codes with samples as rows and variants as columns.
 
     Returns:
         pd.DataFrame: DataFrame with variants as rows and genotype frequencies as columns.
     """
-    counts = df.apply(pd.Series.value_counts).fillna(0).astype(int).T
+    codes = df.to_numpy()
+    counts = np.zeros((codes.shape[1], len(GENOTYPES)), dtype=np.int32)
+    for code in range(len(GENOTYPES)):
+        counts[:, code] = (codes == code).sum(axis=0)
+
+    return _frequencies(counts, df.columns)
+
+
+def _frequencies(counts: np.ndarray, variant_ids: pd.Index) -> pd.DataFrame:
+    """Normalize genotype counts into frequencies.
+
+    Args:
+        counts (np.ndarray): Genotype counts with variants as rows and `GENOTYPES` codes as columns.
+        variant_ids (pd.Index): Variant ID of each row.
+
+    Returns:
+        pd.DataFrame: DataFrame with variants as rows and genotype frequencies as columns.
+    """
+    order = [GENOTYPES.index(genotype) for genotype in GENOTYPES_ORDER]
+    counts = pd.DataFrame(counts[:, order], index=variant_ids, columns=GENOTYPES_ORDER)
+    counts.index.name = "variant"
     totals = counts.sum(axis=1)
     freqs = counts.div(totals, axis=0)
-
-    # Sort columns according to typical genotype order: hom ref > het > hom alt > missing
-    freqs = freqs.reindex(columns=["0/0", "0/1", "1/1", "./."], level=0)
     freqs.columns.name = "genotype"
 
     return freqs